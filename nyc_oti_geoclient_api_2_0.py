@@ -27,181 +27,405 @@
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import numpy as np
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
 import time
+from urllib.parse import urlencode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-# Create a custom function to make API calls to the 'Address' endpoint
+logger = logging.getLogger(__name__)
 
-def oti_geoclient_api_v2_address_endpoint(api_endpoint, headers, df_name, df_key_field, housenum_input_col, street_input_col, boro_input_col=None, zip_input_col=None, response_columns=None):
-    """
-    Fetch data from the OTI geoclient API, merge the response with the original dataframe, and return the merged dataframe.
+# The OTI geoclient api handles 2,500 requests per minute
 
-    Parameters:
-    - api_endpoint (str): The API endpoint URL.
-    - headers (dict): The headers to send with the API request.
-    - df_name (pd.DataFrame): The input pandas DataFrame.
-    - df_key_field (str): The name of the primary key column in the DataFrame.
-    - housenum_input_col (str): The name of the column in the DataFrame that provides the house number for the API.
-    - street_input_col (str): The name of the column in the DataFrame that provides the street name for the API.
-    - boro_input_col (str): The name of the column in the DataFrame that provides the borough for the API (required if zip is not given).
-    - zip_input_col (str): The name of the column in the DataFrame that provides the zip code for the API (required if borough is not given).
-    - response_columns (dict): Optional. A dictionary specifying which API response columns you want to keep.
+API_REQUESTS_PER_MINUTE = 2500
 
-    Returns:
-    - pd.DataFrame: The merged DataFrame containing the original data and the filtered API response data.
+# Create a thread-safe rate limiter shared by all endpoint functions
+
+class _RateLimiter:
     """
+    Allow at most max_calls API calls in any rolling window of period seconds, across all threads.
 
-    # Create a session object
-    session = requests.Session()
-    session.headers.update(headers)
-
-    # Define the function to send a request
-    def send_request(house_number, street, borough=None, zip_code=None):
-        params = {
-            'houseNumber': house_number,
-            'street': street,
-        }
-        if borough:
-            params['borough'] = borough
-        if zip_code:
-            params['zip'] = zip_code
+    acquire() only waits when the window is already full, so batches well under the limit never sleep.
+    pause() holds back every thread until a given time has passed, e.g. after a 429 response.
+    """
 
-        try:
-            response = session.get(api_endpoint, params=params, headers=headers)
-            if response.status_code == 200:
-                json_response = response.json()  # Parse the JSON response
-                if 'address' in json_response:
-                    return json_response['address']  # Return the 'address' object
-                else:
-                    return {}
-            else:
-                return {}
-        except Exception as e:
-            return {}
+    def __init__(self, max_calls, period):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()  # Timestamps of the calls made in the current window
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.period:
+                    self.calls.popleft()
+                if len(self.calls) < self.max_calls and now >= self.resume_at:
+                    self.calls.append(now)
+                    return
+                wait = self.resume_at - now
+                if len(self.calls) >= self.max_calls:
+                    wait = max(wait, self.calls[0] + self.period - now)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+_RATE_LIMITER = _RateLimiter(API_REQUESTS_PER_MINUTE, 60)
+
+def _rate_limited_get(session, url, params, max_429_retries=3):
+    """
+    Send a GET request as soon as the shared rate limiter allows it.
 
-    # Prepare data for processing
-    house_numbers = df_name[housenum_input_col].tolist()
-    streets = df_name[street_input_col].tolist()
-    boroughs = df_name[boro_input_col].tolist() if boro_input_col else [None] * len(df_name)
-    zip_codes = df_name[zip_input_col].tolist() if zip_input_col else [None] * len(df_name)
-    key_field_values = df_name[df_key_field].tolist()
+    A 429 (too many requests) response pauses every thread for the server's Retry-After time before the request is retried.
+    """
+    for attempt in range(max_429_retries + 1):
+        _RATE_LIMITER.acquire()
+        response = session.get(url, params=params)  # The session already sends the headers set in _get_session
+        if response.status_code != 429 or attempt == max_429_retries:
+            return response
+        retry_after = response.headers.get('Retry-After', '1')
+        _RATE_LIMITER.pause(int(retry_after) if retry_after.isdigit() else 1)
 
-    # List to store results
-    results = []
+# Create one session per set of headers that is reused across calls so HTTP keep-alive connections persist
 
-    # Calculate the delay needed to stay within the rate limit
-    delay_per_request = 60 / 2500  # 60 seconds divided by 2500 requests
+_SESSIONS = {}  # frozenset of header items -> (session, connection pool size)
+_SESSION_LOCK = threading.Lock()
 
-    # Send requests sequentially with delay
-    for house_number, street, borough, zip_code in zip(house_numbers, streets, boroughs, zip_codes):
-        result = send_request(house_number, street, borough, zip_code)
-        results.append(result)
-        time.sleep(delay_per_request)  # Delay between requests to respect the rate limit
+def _get_session(headers, pool_size=32):
+    """
+    Return the module-level requests session for these headers, creating it on first use.
 
-    # Convert the list of responses to a DataFrame
-    if results and any(results):  # Check if results list is not empty and contains non-empty dictionaries
-        response_df = pd.DataFrame(results)
+    Each distinct set of headers gets its own session, so headers (such as a subscription key) given to one call
+    are never sent by a call made with different headers.
+    The connection pool is grown when a caller needs more concurrent connections than it currently holds.
+    The pool blocks when all its connections are busy (e.g. two endpoint functions running at once), so extra
+    requests wait for a kept-alive connection instead of opening one that is closed again right after use.
+    """
+    key = frozenset(headers.items())
+
+    with _SESSION_LOCK:
+        session, session_pool_size = _SESSIONS.get(key, (None, 0))
+        if session is None:
+            session = requests.Session()
+            session.headers.update(headers)
+        if pool_size > session_pool_size:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True,
+                                  max_retries=Retry(total=5, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504],
+                                                    allowed_methods=['GET'], respect_retry_after_header=True))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session_pool_size = pool_size
+        _SESSIONS[key] = (session, session_pool_size)
+        return session
+
+# Cache API responses on disk; Geoclient results rarely change, so repeated queries across runs skip the API
+
+CACHE_PATH = 'geoclient_cache.sqlite'
+CACHE_EXPIRE_AFTER = 60 * 60 * 24 * 14  # 14 days, in seconds
+
+class _ResponseCache:
+    """
+    Thread-safe sqlite cache of parsed JSON API responses, keyed by the endpoint URL and the query parameters.
 
-        # If response_columns dictionary is provided, filter to keep only those columns
-        if response_columns:
-            response_df = response_df[response_columns]
+    The database file is only created the first time the cache is used. When path or expire_after is None,
+    the module's CACHE_PATH or CACHE_EXPIRE_AFTER is read each time the cache is used, so changing them takes effect.
+    """
 
-        # Add the df_key_field from the original dataframe to the response_df for merging
-        response_df[df_key_field] = key_field_values
+    def __init__(self, path=None, expire_after=None):
+        self.path = path
+        self.expire_after = expire_after
+        self.connection = None
+        self.connection_path = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        path = self.path or CACHE_PATH
+        if self.connection is None or path != self.connection_path:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, response TEXT)')
+            self.connection, self.connection_path = connection, path
+        return self.connection
+
+    @staticmethod
+    def _key(url, params):
+        return url + '?' + urlencode(sorted(params.items()))
+
+    def get(self, url, params):
+        with self.lock:
+            row = self._connect().execute('SELECT created, response FROM responses WHERE key = ?', (self._key(url, params),)).fetchone()
+        expire_after = CACHE_EXPIRE_AFTER if self.expire_after is None else self.expire_after
+        if row is None or time.time() - row[0] > expire_after:
+            return None
+        return json.loads(row[1])
+
+    def set(self, url, params, json_response):
+        with self.lock:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (self._key(url, params), time.time(), json.dumps(json_response)))
+            connection.commit()
+
+_RESPONSE_CACHE = _ResponseCache()
+
+# Send one query to a Geoclient endpoint and return the object it found
+
+def _fetch(session, api_endpoint, params, response_key, response_columns=None, cache_enabled=True):
+    """
+    Look up one query in the response cache or the API and return the response_key object ('address', 'bin' or 'bbl').
 
-        # Perform a left join of the original DataFrame with the response DataFrame on df_key_field
-        merged_df = pd.merge(df_name, response_df, on=df_key_field, how='left')
+    Only response_columns are kept from the object when provided. Returns an empty dictionary when the API has no match,
+    and {'_error': message} when the request failed.
+    """
+    # Cache hits skip both the API call and the rate limiter
+    json_response = None
+    if cache_enabled:
+        try:
+            json_response = _RESPONSE_CACHE.get(api_endpoint, params)
+        except sqlite3.Error as e:
+            # A locked, full or unreadable cache must not lose the results; just ask the API
+            logger.warning('Response cache lookup failed for %s: %s', params, e)
+    if json_response is None:
+        try:
+            response = _rate_limited_get(session, api_endpoint, params)
+            if response.status_code == 429:
+                # Still rate limited after retrying: report an error rather than an empty match
+                logger.warning('Request failed for %s: HTTP 429', params)
+                return {'_error': 'HTTP 429'}
+            if response.status_code != 200:
+                return {}
+            json_response = response.json()  # Parse the JSON response
+        except requests.exceptions.RequestException as e:
+            # Network errors and exhausted 5xx retries are flagged so those rows can be retried later
+            logger.warning('Request failed for %s: %s', params, e)
+            return {'_error': str(e)}
+        if cache_enabled:
+            try:
+                _RESPONSE_CACHE.set(api_endpoint, params, json_response)
+            except sqlite3.Error as e:
+                logger.warning('Response cache write failed for %s: %s', params, e)
+
+    if response_key in json_response:
+        result = json_response[response_key]
+        if response_columns:
+            # Keep only the requested fields so the rest of the response is released right away
+            return {name: result.get(name) for name in response_columns}
+        return result
     else:
-        # If all results are empty, return the original DataFrame
-        merged_df = df_name.copy()
+        return {}
 
-    # Close the session when done
-    session.close()
+# Collect API results into DataFrames, sending the requests in chunks that can be checkpointed to disk
 
-    return merged_df
-
-# Create a custom function to make API calls to the 'BIN' endpoint
+def _results_to_df(results, response_columns=None, dtype_backend=None):
+    """
+    Build a DataFrame with one row per API result by collecting each response field into its own column.
 
-def oti_geoclient_api_v2_bin_endpoint(api_endpoint, headers, df_name, df_key_field, api_input_column, response_columns=None):
+    Only response_columns are kept when provided (plus an '_error' column if any request failed);
+    otherwise every returned field is kept, in the order it was first seen.
+    With dtype_backend='pyarrow' the columns are built by pyarrow and returned as pyarrow-backed dtypes.
     """
-    Fetch data from the OTI geoclient API, merge the response with the original dataframe, and return the merged dataframe.
+    column_names = response_columns or list(dict.fromkeys(key for result in results for key in result))
+    if response_columns and any('_error' in result for result in results):
+        column_names = column_names + ['_error']  # Keep the errors so failed rows can be found and retried
+    response_data = {name: [result.get(name) for result in results] for name in column_names}
+    if dtype_backend == 'pyarrow' and response_data:
+        import pyarrow as pa
+        try:
+            table = pa.table(response_data)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # A field returned as a number in some rows and as text in others cannot be one arrow column
+            table = pa.table({name: _mixed_to_str(values) for name, values in response_data.items()})
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return pd.DataFrame(response_data, index=pd.RangeIndex(len(results)))
+
+def _mixed_to_str(values):
+    """
+    Return values unchanged when pyarrow can store them as one column, otherwise with every value except None converted to str.
+    """
+    import pyarrow as pa
+    try:
+        pa.array(values)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        return [None if value is None else str(value) for value in values]
+    return values
+
+def _check_checkpoint_manifest(checkpoint_dir, unique_params, response_columns, chunk_size, dtype_backend=None):
+    """
+    Make sure the checkpoints in checkpoint_dir belong to the same queries, response_columns, chunk_size and dtype_backend.
 
-    Parameters:
-    - api_endpoint (str): The API endpoint URL.
-    - headers (dict): The headers to send with the API request.
-    - df_name (pd.DataFrame): The input pandas DataFrame.
-    - df_key_field (str): The name of the primary key column in the DataFrame.
-    - api_input_column (str): The name of the column in the DataFrame that provides input for the API.
-    - response_columns (dict): Optional. A dictionary specifying which API response columns you want to keep.
+    The first run writes a manifest.json with a hash of those; later runs raise a ValueError when the hash differs,
+    or when the directory holds chunk files without a manifest, instead of attaching stale results to the wrong rows.
+    """
+    fingerprint = hashlib.sha256(json.dumps([unique_params, response_columns, chunk_size, dtype_backend], default=str).encode()).hexdigest()
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        if manifest.get('fingerprint') != fingerprint:
+            raise ValueError(f'The checkpoints in {checkpoint_dir} were written for different input data, response_columns, chunk_size or dtype_backend; '
+                             'delete the directory or use a new checkpoint_dir')
+    elif any(name.startswith('chunk_') for name in os.listdir(checkpoint_dir)):
+        raise ValueError(f'{checkpoint_dir} holds checkpoint files without a manifest.json; delete them or use a new checkpoint_dir')
+    else:
+        with open(manifest_path, 'w') as file:
+            json.dump({'fingerprint': fingerprint, 'queries': len(unique_params), 'chunk_size': chunk_size, 'dtype_backend': dtype_backend}, file)
 
-    Returns:
-    - pd.DataFrame: The merged DataFrame containing the original data and the filtered API response data.
+def _send_in_chunks(send_request, unique_params, response_columns, max_workers, checkpoint_dir=None, chunk_size=10_000, dtype_backend=None):
     """
+    Call send_request once per query parameters dictionary in unique_params and return the results as a DataFrame in the same order.
 
-    # Create a session object
-    session = requests.Session()
-    session.headers.update(headers)
+    Requests are sent concurrently, chunk_size items at a time. When checkpoint_dir is given, each finished chunk is
+    written to checkpoint_dir/chunk_<i>.parquet, and chunks that already have a file are loaded instead of being sent again,
+    so an interrupted run can be resumed. A manifest in checkpoint_dir makes sure the files belong to the same queries,
+    response_columns, chunk_size and dtype_backend.
+    """
+    if dtype_backend not in (None, 'pyarrow'):
+        raise ValueError(f"dtype_backend must be None or 'pyarrow', got {dtype_backend!r}")
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        _check_checkpoint_manifest(checkpoint_dir, unique_params, response_columns, chunk_size, dtype_backend)
+
+    chunk_dfs = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_index, chunk_start in enumerate(range(0, len(unique_params), chunk_size)):
+            checkpoint_path = os.path.join(checkpoint_dir, f'chunk_{chunk_index}.parquet') if checkpoint_dir else None
+            if checkpoint_path and os.path.exists(checkpoint_path):
+                chunk_df = pd.read_parquet(checkpoint_path, dtype_backend=dtype_backend) if dtype_backend else pd.read_parquet(checkpoint_path)
+                chunk_length = min(chunk_size, len(unique_params) - chunk_start)
+                if len(chunk_df.columns) and len(chunk_df) != chunk_length:
+                    raise ValueError(f'{checkpoint_path} has {len(chunk_df)} rows but {chunk_length} were expected; delete the checkpoints and re-run')
+                # A chunk where every result was empty is saved without columns, and parquet then drops its rows
+                chunk_dfs.append(chunk_df.reindex(pd.RangeIndex(chunk_length)))
+                continue
+
+            # executor.map returns the results in the same order as the rows
+            chunk_results = list(executor.map(send_request, unique_params[chunk_start:chunk_start + chunk_size]))
+            chunk_df = _results_to_df(chunk_results, response_columns, dtype_backend)
+            if checkpoint_path:
+                import pyarrow as pa
+                try:
+                    chunk_df.to_parquet(checkpoint_path, compression='zstd')
+                except (pa.ArrowTypeError, pa.ArrowInvalid):
+                    # Parquet needs one type per column, so store fields with mixed types as text (in this run too,
+                    # so a resumed run returns the same values)
+                    object_columns = [name for name in chunk_df.columns if chunk_df[name].dtype == object]
+                    chunk_df = chunk_df.assign(**{name: _mixed_to_str(chunk_df[name].tolist()) for name in object_columns})
+                    chunk_df.to_parquet(checkpoint_path, compression='zstd')
+            chunk_dfs.append(chunk_df)
+
+    if not chunk_dfs:
+        return _results_to_df([], response_columns, dtype_backend)
+    return pd.concat(chunk_dfs, ignore_index=True)
+
+# Attach response columns to the input rows by position
+
+def _attach_by_position(df_name, response_df):
+    """
+    Attach the rows of response_df to the rows of df_name in order, keeping df_name's index (duplicates included).
 
-    # Define the function to send a request
-    def send_request(bin_input):
-        params = {'bin': bin_input}
-        #print(f"Sending request to API with URL: {api_endpoint} and headers: {headers}")  # Print the full URL and headers
-        try:
-            response = session.get(api_endpoint, params=params, headers=headers)
-            if response.status_code == 200:
-                json_response = response.json()  # Parse the JSON response
-                if 'bin' in json_response:
-                    return json_response['bin']  # Return the 'bin' object
-                else:
-                    return {}
-            else:
-                return {}
-        except Exception as e:
-            #print(f"Request failed for {bin_input}: {e}")
-            return {}
+    Response columns whose names are already used in df_name get a '_geo' suffix.
+    """
+    response_df = response_df.set_axis(df_name.index).rename(columns=lambda name: f'{name}_geo' if name in df_name.columns else name)
+    return pd.concat([df_name, response_df], axis=1)
 
-    # Prepare data for processing
-    bins = df_name[api_input_column].tolist()
-    key_field_values = df_name[df_key_field].tolist()
+# Attach results from an earlier run instead of calling the API
 
-    # List to store results
-    results = []
+def _attach_lookup(df_name, input_cols, lookup_df, response_columns=None):
+    """
+    Add the response columns of lookup_df to df_name by looking up each row's API input values.
 
-    # Calculate the delay needed to stay within the rate limit
-    delay_per_request = 60 / 2500  # 60 seconds divided by 2500 requests
+    lookup_df must be indexed by the values of the API input columns, in the same order as input_cols and with the same
+    dtypes (an int BIN column does not match a string BIN index), and unique on that index.
+    Only response_columns are attached when provided; otherwise every lookup_df column that is not already in df_name.
+    Rows with no match in lookup_df get empty values.
+    """
+    if not lookup_df.index.is_unique:
+        raise ValueError('lookup_df must have a unique index; drop duplicate inputs first, e.g. with drop_duplicates()')
 
-    # Send requests sequentially with delay
-    for bin_input in bins:
-        result = send_request(bin_input)
-        results.append(result)
-        time.sleep(delay_per_request)  # Delay between requests to respect the rate limit
+    keys = df_name[input_cols[0]] if len(input_cols) == 1 else pd.MultiIndex.from_frame(df_name[input_cols])
+    column_names = response_columns or [name for name in lookup_df.columns if name not in df_name.columns]
+    response_df = lookup_df[column_names].reindex(keys)
+    return _attach_by_position(df_name, response_df)
 
-    # Convert the list of responses to a DataFrame
-    if results and any(results):  # Check if results list is not empty and contains non-empty dictionaries
-        response_df = pd.DataFrame(results)
+# Run a dataframe through one Geoclient endpoint; the public functions below only differ in their query parameters
 
-        # If response_columns dictionary is provided, filter to keep only those columns
-        if response_columns:
-            response_df = response_df[response_columns]
+def _run_endpoint(api_endpoint, headers, df_name, input_cols, param_names, response_key, response_columns=None, max_workers=25,
+                  cache_enabled=True, lookup_df=None, checkpoint_dir=None, chunk_size=10_000, dtype_backend=None):
+    """
+    Send the distinct values of input_cols in df_name to the API and return df_name joined with the API results.
 
-        # Add the df_key_field from the original dataframe to the response_df for merging
-        response_df[df_key_field] = key_field_values
+    param_names gives the API query parameter for each input column, in the same order as input_cols,
+    and response_key names the object to take from each JSON response ('address', 'bin' or 'bbl').
+    The other parameters are documented on the public endpoint functions.
+    """
 
-        # Perform a left join of the original DataFrame with the response DataFrame on df_key_field
-        merged_df = pd.merge(df_name, response_df, on=df_key_field, how='left')
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be at least 1, got {chunk_size!r}')
+    if max_workers < 1:
+        raise ValueError(f'max_workers must be at least 1, got {max_workers!r}')
+
+    # Normalize response_columns to a list, so _fetch can keep just those fields from each response;
+    # a single column name is wrapped rather than split into its characters
+    if isinstance(response_columns, str):
+        response_columns = [response_columns]
+    response_columns = list(response_columns) if response_columns else None
+
+    # If a lookup table of earlier results is given, attach its columns and skip the API entirely
+    if lookup_df is not None:
+        return _attach_lookup(df_name, input_cols, lookup_df, response_columns)
+
+    # Reuse the shared session for these headers, with a connection pool large enough for every worker thread
+    session = _get_session(headers, max(32, max_workers))
+
+    # Send each query through the shared session, response cache and rate limiter
+    send_request = partial(_fetch, session, api_endpoint, response_key=response_key,
+                           response_columns=response_columns, cache_enabled=cache_enabled)
+
+    # Factorize the input rows into integer codes (in order of first appearance) so each distinct query is only sent to the API once
+    input_values = df_name[input_cols[0]] if len(input_cols) == 1 else pd.MultiIndex.from_frame(df_name[input_cols])
+    row_positions, unique_rows = pd.factorize(input_values, use_na_sentinel=False)
+
+    # Send the distinct queries concurrently, in chunks that can be checkpointed to disk
+    # The parameter names are fixed for the whole call, so each query is a zip of names and values;
+    # factorizing turns missing inputs (None) into NaN, so leave those out rather than sending 'nan', and skip empty
+    # strings too, so a row with a blank borough or zip code is sent with the other one only
+    if len(param_names) == 1:
+        unique_rows = [(value,) for value in unique_rows]
+    unique_params = [{name: value for name, value in zip(param_names, row) if not pd.isna(value) and value != ''}
+                     for row in unique_rows]
+    unique_response_df = _send_in_chunks(send_request, unique_params, response_columns, max_workers, checkpoint_dir, chunk_size, dtype_backend)
+
+    # Convert the responses to a DataFrame
+    if unique_response_df.notna().to_numpy().any():  # Check if at least one request returned data
+        # Expand the results back to one row per input row
+        response_df = unique_response_df.take(row_positions)
+
+        # Results are in the same order as the rows of df_name, so attach them by position instead of merging on a key field
+        merged_df = _attach_by_position(df_name, response_df)
     else:
         # If all results are empty, return the original DataFrame
-        #print("API returned empty results for all rows.")
         merged_df = df_name.copy()
 
-    # Close the session when done
-    session.close()
-
     return merged_df
 
-# Create a custom function to make API calls to the 'BBL' endpoint
+# Create a custom function to make API calls to the 'Address' endpoint
 
-def oti_geoclient_api_v2_bbl_endpoint(api_endpoint, headers, df_name, df_key_field, boro_input_col, block_input_col, lot_input_col, response_columns=None):
+def oti_geoclient_api_v2_address_endpoint(api_endpoint, headers, df_name, df_key_field, housenum_input_col, street_input_col, boro_input_col=None, zip_input_col=None, response_columns=None, max_workers=25, cache_enabled=True, lookup_df=None, checkpoint_dir=None, chunk_size=10_000, dtype_backend=None):
     """
     Fetch data from the OTI geoclient API, merge the response with the original dataframe, and return the merged dataframe.
 
@@ -209,79 +433,91 @@ def oti_geoclient_api_v2_bbl_endpoint(api_endpoint, headers, df_name, df_key_fie
     - api_endpoint (str): The API endpoint URL.
     - headers (dict): The headers to send with the API request.
     - df_name (pd.DataFrame): The input pandas DataFrame.
-    - df_key_field (str): The name of the primary key column in the DataFrame.
-    - boro_input_col (str): The name of the column in the DataFrame that provides the borough input for the API.
-    - block_input_col (str): The name of the column in the DataFrame that provides the block input for the API.
-    - lot_input_col (str): The name of the column in the DataFrame that provides the lot input for the API.
-    - response_columns (dict): Optional. A dictionary specifying which API response columns you want to keep.
+    - df_key_field (str): The name of the primary key column in the DataFrame. API results are matched to rows by position, so the key does not need to be unique.
+    - housenum_input_col (str): The name of the column in the DataFrame that provides the house number for the API.
+    - street_input_col (str): The name of the column in the DataFrame that provides the street name for the API.
+    - boro_input_col (str): The name of the column in the DataFrame that provides the borough for the API (required if zip is not given).
+    - zip_input_col (str): The name of the column in the DataFrame that provides the zip code for the API (required if borough is not given).
+    - response_columns (list): Optional. The names of the API response columns you want to keep (any iterable of names, or a single name, is accepted).
+    - max_workers (int): Optional. The number of requests to keep in flight at the same time (default 25).
+    - cache_enabled (bool): Optional. Reuse API responses cached on disk in CACHE_PATH for up to 14 days (default True).
+    - lookup_df (pd.DataFrame): Optional. Earlier API results with a unique index of the address input columns (house number, street, then borough and/or zip code if given; same dtypes as the input columns); when given, the response columns are looked up in it and the API is not called.
+    - checkpoint_dir (str): Optional. A directory where results are saved as parquet files every chunk_size distinct queries, so an interrupted run can be resumed. Raises a ValueError if it holds checkpoints from different input data, response_columns, chunk_size or dtype_backend.
+    - chunk_size (int): Optional. The number of distinct queries per checkpoint chunk (default 10,000).
+    - dtype_backend (str): Optional. Set to 'pyarrow' to build the API response columns with pyarrow and return them as pyarrow-backed dtypes (requires pyarrow).
 
     Returns:
     - pd.DataFrame: The merged DataFrame containing the original data and the filtered API response data.
+      If any request failed (network error, server error or rate limiting), an '_error' column holds the error message for those rows.
     """
 
-    # Create a session object
-    session = requests.Session()
-    session.headers.update(headers)
-
-    # Define the function to send a request
-    def send_request(borough, block, lot):
-        params = {
-            'borough': borough,
-            'block': block,
-            'lot': lot
-        }
-        #print(f"Sending request to API with URL: {api_endpoint}, params: {params}, and headers: {headers}")  # Print the full URL, params, and headers
-        try:
-            response = session.get(api_endpoint, params=params)
-            if response.status_code == 200:
-                json_response = response.json()  # Parse the JSON response
-                if 'bbl' in json_response:
-                    return json_response['bbl']  # Return the 'bbl' object
-                else:
-                    return {}
-            else:
-                return {}
-        except Exception as e:
-            #print(f"Request failed for bbl {borough}{block}{lot}: {e}")
-            return {}
+    # Map each API query parameter to the input column that provides it; borough and zip are only sent when their column is given
+    input_cols = {'houseNumber': housenum_input_col, 'street': street_input_col}
+    if boro_input_col:
+        input_cols['borough'] = boro_input_col
+    if zip_input_col:
+        input_cols['zip'] = zip_input_col
 
-    # Prepare data for processing
-    boroughs = df_name[boro_input_col].tolist()
-    blocks = df_name[block_input_col].tolist()
-    lots = df_name[lot_input_col].tolist()
-    key_field_values = df_name[df_key_field].tolist()
+    return _run_endpoint(api_endpoint, headers, df_name, list(input_cols.values()), list(input_cols), 'address',
+                         response_columns=response_columns, max_workers=max_workers, cache_enabled=cache_enabled,
+                         lookup_df=lookup_df, checkpoint_dir=checkpoint_dir, chunk_size=chunk_size, dtype_backend=dtype_backend)
 
-    # List to store results
-    results = []
+# Create a custom function to make API calls to the 'BIN' endpoint
 
-    # Calculate the delay needed to stay within the rate limit
-    delay_per_request = 60 / 2500  # 60 seconds divided by 2500 requests
+def oti_geoclient_api_v2_bin_endpoint(api_endpoint, headers, df_name, df_key_field, api_input_column, response_columns=None, max_workers=25, cache_enabled=True, lookup_df=None, checkpoint_dir=None, chunk_size=10_000, dtype_backend=None):
+    """
+    Fetch data from the OTI geoclient API, merge the response with the original dataframe, and return the merged dataframe.
 
-    # Send requests sequentially with delay
-    for borough, block, lot in zip(boroughs, blocks, lots):
-        result = send_request(borough, block, lot)
-        results.append(result)
-        time.sleep(delay_per_request)  # Delay between requests to respect the rate limit
+    Parameters:
+    - api_endpoint (str): The API endpoint URL.
+    - headers (dict): The headers to send with the API request.
+    - df_name (pd.DataFrame): The input pandas DataFrame.
+    - df_key_field (str): The name of the primary key column in the DataFrame. API results are matched to rows by position, so the key does not need to be unique.
+    - api_input_column (str): The name of the column in the DataFrame that provides input for the API.
+    - response_columns (list): Optional. The names of the API response columns you want to keep (any iterable of names, or a single name, is accepted).
+    - max_workers (int): Optional. The number of requests to keep in flight at the same time (default 25).
+    - cache_enabled (bool): Optional. Reuse API responses cached on disk in CACHE_PATH for up to 14 days (default True).
+    - lookup_df (pd.DataFrame): Optional. Earlier API results with a unique index of BINs (same dtype as api_input_column); when given, the response columns are looked up in it and the API is not called.
+    - checkpoint_dir (str): Optional. A directory where results are saved as parquet files every chunk_size distinct queries, so an interrupted run can be resumed. Raises a ValueError if it holds checkpoints from different input data, response_columns, chunk_size or dtype_backend.
+    - chunk_size (int): Optional. The number of distinct queries per checkpoint chunk (default 10,000).
+    - dtype_backend (str): Optional. Set to 'pyarrow' to build the API response columns with pyarrow and return them as pyarrow-backed dtypes (requires pyarrow).
 
-    # Convert the list of responses to a DataFrame
-    if results and any(results):  # Check if results list is not empty and contains non-empty dictionaries
-        response_df = pd.DataFrame(results)
+    Returns:
+    - pd.DataFrame: The merged DataFrame containing the original data and the filtered API response data.
+      If any request failed (network error, server error or rate limiting), an '_error' column holds the error message for those rows.
+    """
 
-        # If response_columns dictionary is provided, filter to keep only those columns
-        if response_columns:
-            response_df = response_df[response_columns]
+    return _run_endpoint(api_endpoint, headers, df_name, [api_input_column], ['bin'], 'bin',
+                         response_columns=response_columns, max_workers=max_workers, cache_enabled=cache_enabled,
+                         lookup_df=lookup_df, checkpoint_dir=checkpoint_dir, chunk_size=chunk_size, dtype_backend=dtype_backend)
 
-        # Add the df_key_field from the original dataframe to the response_df for merging
-        response_df[df_key_field] = key_field_values
+# Create a custom function to make API calls to the 'BBL' endpoint
 
-        # Perform a left join of the original DataFrame with the response DataFrame on df_key_field
-        merged_df = pd.merge(df_name, response_df, on=df_key_field, how='left')
-    else:
-        # If all results are empty, return the original DataFrame
-        #print("API returned empty results for all rows.")
-        merged_df = df_name.copy()
+def oti_geoclient_api_v2_bbl_endpoint(api_endpoint, headers, df_name, df_key_field, boro_input_col, block_input_col, lot_input_col, response_columns=None, max_workers=25, cache_enabled=True, lookup_df=None, checkpoint_dir=None, chunk_size=10_000, dtype_backend=None):
+    """
+    Fetch data from the OTI geoclient API, merge the response with the original dataframe, and return the merged dataframe.
 
-    # Close the session when done
-    session.close()
+    Parameters:
+    - api_endpoint (str): The API endpoint URL.
+    - headers (dict): The headers to send with the API request.
+    - df_name (pd.DataFrame): The input pandas DataFrame.
+    - df_key_field (str): The name of the primary key column in the DataFrame. API results are matched to rows by position, so the key does not need to be unique.
+    - boro_input_col (str): The name of the column in the DataFrame that provides the borough input for the API.
+    - block_input_col (str): The name of the column in the DataFrame that provides the block input for the API.
+    - lot_input_col (str): The name of the column in the DataFrame that provides the lot input for the API.
+    - response_columns (list): Optional. The names of the API response columns you want to keep (any iterable of names, or a single name, is accepted).
+    - max_workers (int): Optional. The number of requests to keep in flight at the same time (default 25).
+    - cache_enabled (bool): Optional. Reuse API responses cached on disk in CACHE_PATH for up to 14 days (default True).
+    - lookup_df (pd.DataFrame): Optional. Earlier API results with a unique index of borough, block and lot (same dtypes as the input columns); when given, the response columns are looked up in it and the API is not called.
+    - checkpoint_dir (str): Optional. A directory where results are saved as parquet files every chunk_size distinct queries, so an interrupted run can be resumed. Raises a ValueError if it holds checkpoints from different input data, response_columns, chunk_size or dtype_backend.
+    - chunk_size (int): Optional. The number of distinct queries per checkpoint chunk (default 10,000).
+    - dtype_backend (str): Optional. Set to 'pyarrow' to build the API response columns with pyarrow and return them as pyarrow-backed dtypes (requires pyarrow).
 
-    return merged_df
+    Returns:
+    - pd.DataFrame: The merged DataFrame containing the original data and the filtered API response data.
+      If any request failed (network error, server error or rate limiting), an '_error' column holds the error message for those rows.
+    """
+
+    return _run_endpoint(api_endpoint, headers, df_name, [boro_input_col, block_input_col, lot_input_col], ['borough', 'block', 'lot'], 'bbl',
+                         response_columns=response_columns, max_workers=max_workers, cache_enabled=cache_enabled,
+                         lookup_df=lookup_df, checkpoint_dir=checkpoint_dir, chunk_size=chunk_size, dtype_backend=dtype_backend)